@@ -0,0 +1,208 @@
+import sys
+import asyncio
+import logging
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor
+
+# Приоритеты: чем меньше число, тем раньше обрабатывается
+HIGH = 0   # дешевые команды и изменения вайба
+LOW = 1    # тяжелые чтения: топ, история, достижения, статистика
+PRIORITY_NAMES = {HIGH: 'high', LOW: 'low'}
+
+
+class AdmissionController:
+    """Ограничивает число одновременно обрабатываемых обновлений.
+
+    Лишние запросы ждут в отдельной ограниченной очереди для каждого приоритета;
+    освободившееся место всегда получает самый приоритетный запрос. Запросы
+    с приоритетом LOW отбрасываются, если очередь полна, а если место не
+    освободилось за latency_target — в момент истечения этого срока. HIGH
+    отбрасываются только при полной очереди.
+
+    Запросы с одним ключом (например, от одного пользователя) выполняются по
+    одному, в порядке поступления. Запрос, ждущий предыдущий запрос своего ключа,
+    стоит в той же очереди: он учитывается в ее лимите, счетчиках и сроке ожидания.
+    """
+
+    def __init__(self, max_concurrency, queue_limits, latency_target):
+        self.max_concurrency = max_concurrency
+        self.queue_limits = queue_limits
+        self.latency_target = latency_target
+        self.active = 0
+        # Элементы очередей — пары (future, ключ)
+        self.queues = {priority: deque() for priority in sorted(queue_limits)}
+        self.counters = {priority: {'admitted': 0, 'queued': 0, 'shed': 0} for priority in queue_limits}
+        # ключ -> ожидающие запросы этого ключа в порядке поступления; ключи выполняющихся запросов
+        self._pending = {}
+        self._running = set()
+
+    def _sheddable(self, priority):
+        return priority != HIGH
+
+    def _key_free(self, key):
+        return key is None or (key not in self._running and key not in self._pending)
+
+    async def acquire(self, priority, key=None):
+        """Возвращает True, когда можно выполнять обработчик, или False, если запрос отброшен.
+
+        После выполнения обработчика нужно вызвать release(key) с тем же ключом.
+        """
+        counters = self.counters[priority]
+        # Свободное место при ждущих в очереди бывает, только если их ключи заняты,
+        # так что новый запрос со свободным ключом никого не обгоняет
+        if self.active < self.max_concurrency and self._key_free(key):
+            self._start(key)
+            counters['admitted'] += 1
+            return True
+
+        queue = self.queues[priority]
+        if len(queue) >= self.queue_limits[priority]:
+            counters['shed'] += 1
+            return False
+
+        loop = asyncio.get_running_loop()
+        entry = (loop.create_future(), key)
+        queue.append(entry)
+        if key is not None:
+            self._pending.setdefault(key, deque()).append(entry[0])
+        counters['queued'] += 1
+        timer = None
+        if self._sheddable(priority):
+            timer = loop.call_later(self.latency_target, self._expire, priority, entry)
+        try:
+            admitted = await entry[0]
+        except asyncio.CancelledError:
+            future = entry[0]
+            if future.done() and not future.cancelled() and future.result():
+                # Место уже выдано, но запрос отменен — возвращаем место
+                self.release(key)
+            else:
+                # Следующий запрос того же ключа мог ждать именно этот
+                self._remove(priority, entry)
+                self._dispatch()
+            raise
+        finally:
+            if timer:
+                timer.cancel()
+
+        if admitted:
+            counters['admitted'] += 1
+        else:
+            counters['shed'] += 1
+        return admitted
+
+    def _start(self, key):
+        self.active += 1
+        if key is not None:
+            self._running.add(key)
+
+    def _remove(self, priority, entry):
+        future, key = entry
+        queue = self.queues[priority]
+        if entry in queue:
+            queue.remove(entry)
+        pending = self._pending.get(key)
+        if pending and future in pending:
+            pending.remove(future)
+            if not pending:
+                del self._pending[key]
+
+    def _expire(self, priority, entry):
+        # Срок ожидания истек, а место так и не освободилось
+        if not entry[0].done():
+            self._remove(priority, entry)
+            entry[0].set_result(False)
+            self._dispatch()
+
+    def release(self, key=None):
+        self.active -= 1
+        self._running.discard(key)
+        self._dispatch()
+
+    def _next(self):
+        # Первый по приоритету и времени запрос, ключ которого не занят
+        # и который стоит первым среди запросов своего ключа
+        for priority, queue in self.queues.items():
+            for entry in queue:
+                future, key = entry
+                if future.done():
+                    continue
+                if key is None or (key not in self._running and self._pending[key][0] is future):
+                    return priority, entry
+        return None
+
+    def _dispatch(self):
+        while self.active < self.max_concurrency:
+            found = self._next()
+            if found is None:
+                break
+            priority, entry = found
+            self._remove(priority, entry)
+            self._start(entry[1])
+            entry[0].set_result(True)
+
+    def stats(self):
+        return {
+            'active': self.active,
+            'queues': {PRIORITY_NAMES.get(priority, priority): {'waiting': len(queue), **self.counters[priority]}
+                       for priority, queue in self.queues.items()},
+        }
+
+
+class AdmissionUpdateProcessor(BaseUpdateProcessor):
+    """Пропускает каждое обновление через AdmissionController.
+
+    Обновления одного пользователя обрабатываются строго по очереди, в порядке
+    поступления: на этом держится ConversationHandler. Обновления разных
+    пользователей идут параллельно. classify(update) возвращает приоритет,
+    on_shed(update) вызывается для отброшенного обновления.
+
+    Все ограничения — в контроллере, поэтому собственный лимит PTB по умолчанию
+    не ограничивает ничего: иначе лишние обновления ждали бы в его семафоре, не
+    попадая ни в очереди, ни в счетчики, ни под срок ожидания.
+    """
+
+    def __init__(self, controller, classify, on_shed, max_concurrent_updates=sys.maxsize):
+        super().__init__(max_concurrent_updates)
+        self.controller = controller
+        self.classify = classify
+        self.on_shed = on_shed
+
+    @staticmethod
+    def _sequence_key(update):
+        user = getattr(update, 'effective_user', None)
+        if user:
+            return ('user', user.id)
+        chat = getattr(update, 'effective_chat', None)
+        if chat:
+            return ('chat', chat.id)
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        # Приоритет и срок ожидания определяются сразу при поступлении обновления
+        key = self._sequence_key(update)
+        try:
+            admitted = await self.controller.acquire(self.classify(update), key)
+        except BaseException:
+            coroutine.close()
+            raise
+
+        if not admitted:
+            coroutine.close()
+            try:
+                await self.on_shed(update)
+            except Exception as e:
+                logging.error(f"Error in on_shed: {e}")
+            return
+
+        try:
+            await coroutine
+        finally:
+            self.controller.release(key)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
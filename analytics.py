@@ -0,0 +1,210 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from time import monotonic
+
+# numpy импортируется внутри функций: он нужен только для расчета статистики,
+# а модуль загружается при старте бота ради invalidate() и day_sql()
+
+DB_PATH = 'vibe_tracker.db'
+
+STATS_DAYS = 30          # За сколько дней считаем статистику
+ROLLING_WINDOW = 7       # Окно скользящего среднего
+TOP_N = 5                # Сколько участников показывать в рейтингах
+TIME_BUDGET = 3.0        # Максимальное время расчета, секунды
+CACHE_TTL = 600          # Запасное время жизни кэша (на случай записи из другого процесса)
+CACHE_MAX_CHATS = 1000   # Сколько чатов держим в кэше
+FETCH_SIZE = 50000
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+
+EPOCH = date(1970, 1, 1)
+
+# Кэш читают и пишут потоки /stats и event loop (invalidate), поэтому все под _lock.
+# Для чатов, по которым сейчас идет расчет: chat_id -> [поколение, число расчетов].
+# Поколение растет при каждом invalidate(): результат расчета, во время которого
+# чат изменился, в кэш не попадает. Запись удаляется, когда расчетов не остается.
+_cache = OrderedDict()
+_computing = {}
+_lock = threading.Lock()
+
+
+class StatsTimeout(Exception):
+    pass
+
+
+def day_number(d):
+    return (d - EPOCH).days
+
+
+def day_sql(column):
+    """SQL-выражение: номер дня от 1970-01-01 по дате из строки timestamp."""
+    return f"CAST(julianday(substr({column}, 1, 10)) - 2440587.5 AS INTEGER)"
+
+
+def load_columns(conn, query, params, width):
+    """Читает результат запроса в массив (n, width) пачками, без fetchall()."""
+    import numpy as np
+
+    c = conn.cursor()
+    c.execute(query, params)
+    chunks = []
+    while True:
+        rows = c.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype=np.int64).reshape(-1, width))
+    if not chunks:
+        return np.empty((0, width), dtype=np.int64)
+    return np.concatenate(chunks)
+
+
+def top_by(keys, weights=None, n=TOP_N):
+    """Возвращает [(ключ, сумма)] для n ключей с наибольшей суммой весов (или числом записей)."""
+    import numpy as np
+
+    if len(keys) == 0:
+        return []
+    unique, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, weights=weights, minlength=len(unique))
+    order = np.argsort(totals, kind='stable')[::-1][:n]
+    return [(int(unique[i]), int(totals[i])) for i in order if totals[i] > 0]
+
+
+def compute_stats(chat_id, days=STATS_DAYS, db_path=DB_PATH, today=None):
+    import numpy as np
+
+    today = today or datetime.now().date()
+    start = today - timedelta(days=days - 1)
+    start_day = day_number(start)
+
+    conn = sqlite3.connect(db_path)
+    deadline = monotonic() + TIME_BUDGET
+    # Прерываем запрос SQLite, если не укладываемся в бюджет времени
+    conn.set_progress_handler(lambda: 1 if monotonic() > deadline else 0, 10000)
+
+    # Читаем дневные итоги (их ведут триггеры из init_db), а не сырую историю
+    try:
+        history = load_columns(conn, '''
+            SELECT day, user_id, total, changes
+            FROM vibe_history_daily
+            WHERE chat_id = ? AND day >= ?
+        ''', (chat_id, start_day), 4)
+
+        transfers = load_columns(conn, '''
+            SELECT from_user_id, to_user_id, amount
+            FROM vibe_transfers_daily
+            WHERE chat_id = ? AND day >= ?
+        ''', (chat_id, start_day), 3)
+    except sqlite3.OperationalError as e:
+        if monotonic() > deadline:
+            raise StatsTimeout() from e
+        raise
+    finally:
+        conn.close()
+
+    day_index = np.clip(history[:, 0] - start_day, 0, days - 1)
+    daily = np.bincount(day_index, weights=history[:, 2], minlength=days)
+    window = min(ROLLING_WINDOW, days)
+    rolling = np.convolve(daily, np.ones(window) / window, mode='valid')
+    changes = int(history[:, 3].sum())
+
+    return {
+        'start': start,
+        'changes': changes,
+        'total': int(history[:, 2].sum()),
+        'daily': daily,
+        'rolling': rolling,
+        'best_day': start + timedelta(days=int(np.argmax(daily))) if changes else None,
+        'active': top_by(history[:, 1], history[:, 3]),
+        'givers': top_by(transfers[:, 0], transfers[:, 2]),
+        'receivers': top_by(transfers[:, 1], transfers[:, 2]),
+    }
+
+
+def get_stats(chat_id, days=STATS_DAYS, db_path=DB_PATH):
+    """Статистика чата из кэша; пересчитывается после invalidate() или по истечении CACHE_TTL."""
+    key = (chat_id, days)
+    start = datetime.now().date() - timedelta(days=days - 1)
+    with _lock:
+        cached = _cache.get(key)
+        # После полуночи окно сдвигается, так что вчерашний расчет тоже устарел
+        if cached and monotonic() - cached[0] < CACHE_TTL and cached[1]['start'] == start:
+            _cache.move_to_end(key)
+            return cached[1]
+        computing = _computing.setdefault(chat_id, [0, 0])
+        computing[1] += 1
+        generation = computing[0]
+
+    stats = None
+    try:
+        stats = compute_stats(chat_id, days, db_path)
+    finally:
+        with _lock:
+            computing[1] -= 1
+            if not computing[1]:
+                del _computing[chat_id]
+            if stats is not None and computing[0] == generation:
+                _cache[key] = (monotonic(), stats)
+                _cache.move_to_end(key)
+                while len(_cache) > CACHE_MAX_CHATS:
+                    _cache.popitem(last=False)
+    return stats
+
+
+def cache_entries():
+    """Копия кэша для отчета о памяти: сам кэш меняют потоки /stats."""
+    with _lock:
+        return dict(_cache)
+
+
+def invalidate(chat_id):
+    with _lock:
+        if chat_id in _computing:
+            _computing[chat_id][0] += 1
+        for key in [key for key in _cache if key[0] == chat_id]:
+            del _cache[key]
+
+
+def sparkline(values):
+    import numpy as np
+
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return ''
+    low, high = values.min(), values.max()
+    if high == low:
+        return SPARK_CHARS[0] * len(values)
+    index = ((values - low) / (high - low) * (len(SPARK_CHARS) - 1)).round().astype(int)
+    return ''.join(SPARK_CHARS[i] for i in index)
+
+
+def format_stats(stats, names, chart=False):
+    """Текст для /stats; names — словарь {user_id: имя}."""
+    days = len(stats['daily'])
+    if not stats['changes']:
+        return f"📊 За последние {days} дней в этом чате не было изменений вайба."
+
+    message = f"📊 Статистика чата за {days} дней:\n\n"
+    message += f"Изменений: {stats['changes']}, всего: {stats['total']:+d}\n"
+    message += f"В среднем за {ROLLING_WINDOW} дней: {stats['rolling'][-1]:+.1f} в день\n"
+    if stats['best_day']:
+        best = stats['daily'].max()
+        message += f"Лучший день: {stats['best_day'].strftime('%d.%m')} ({int(best):+d})\n"
+    if chart:
+        message += f"\n{sparkline(stats['daily'])}\n"
+        message += f"{stats['start'].strftime('%d.%m')} → сегодня\n"
+
+    sections = [
+        ("🔥 Самые активные:", stats['active'], "изм."),
+        ("💝 Больше всех передали:", stats['givers'], "вайба"),
+        ("🎁 Больше всех получили:", stats['receivers'], "вайба"),
+    ]
+    for title, rows, unit in sections:
+        if rows:
+            message += f"\n{title}\n"
+            for i, (user_id, value) in enumerate(rows, 1):
+                message += f"{i}. {names.get(user_id, user_id)}: {value} {unit}\n"
+
+    return message
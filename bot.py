@@ -1,20 +1,61 @@
+from time import perf_counter, monotonic
+# Отсчет времени запуска — до импорта тяжелых зависимостей
+PROCESS_START = perf_counter()
+
 import os
+import sys
+import json
 import logging
+import asyncio
+import tempfile
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from datetime import datetime, time, timedelta
 import sqlite3
 from dotenv import load_dotenv
 from telegram import Update, Message, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
+from telegram.error import BadRequest, ChatMigrated, Forbidden
+from telegram.request import BaseRequest
+from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters, ConversationHandler, CallbackQueryHandler, TypeHandler
+import db
+import vibe_export
+import analytics
+import admission
 
 # Загрузка переменных окружения
 load_dotenv()
 TOKEN = os.getenv('TELEGRAM_TOKEN')
+# Необязательные: файл снимка кэшей между перезапусками и порт для проверки готовности
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH')
+HEALTH_PORT = os.getenv('HEALTH_PORT')
 
 # Состояния разговора
 WAITING_FOR_NOTE = 1
 WAITING_FOR_TRANSFER_AMOUNT = 2
 WAITING_FOR_TRANSFER_TARGET = 3
 
+# Живой рейтинг: не чаще одного редактирования закрепленного сообщения за интервал
+LIVE_LEADERBOARD_INTERVAL = 30
+TOP_CACHE_MAX_CHATS = 1000
+# Запасное время жизни кэша топа — на случай записи из другого процесса (например, импорта)
+TOP_CACHE_TTL = 600
+
+# Брошенные диалоги завершаются по таймауту, а user_data/chat_data неактивных
+# пользователей и чатов удаляются через USER_DATA_TTL секунд
+CONVERSATION_TIMEOUT = 300
+USER_DATA_TTL = int(os.getenv('USER_DATA_TTL', 24 * 3600))
+SWEEP_INTERVAL = 600
+
+# Контроль нагрузки: сколько обновлений обрабатывается одновременно, размеры очередей
+# и допустимое ожидание для тяжелых команд, секунды (отсчитывается с момента поступления).
+# В очереди стоят и обновления, ждущие предыдущее обновление того же пользователя
+ADMISSION_CONCURRENCY = 8
+ADMISSION_QUEUE_LIMITS = {admission.HIGH: 1000, admission.LOW: 50}
+ADMISSION_LATENCY_TARGET = 2.0
+HEAVY_COMMANDS = {'topvibe', 'history', 'achievements', 'stats', 'export'}
+
 # Достижения
 ACHIEVEMENTS = {
     'first_vibe': {
@@ -65,69 +106,6 @@ logging.basicConfig(
     level=logging.INFO
 )
 
-# Инициализация базы данных
-def init_db():
-    try:
-        conn = sqlite3.connect('vibe_tracker.db')
-        c = conn.cursor()
-        
-        # Создание таблицы для хранения вайба пользователей
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS user_vibes
-            (user_id INTEGER,
-             chat_id INTEGER,
-             username TEXT,
-             vibe_score INTEGER DEFAULT 0,
-             last_update TIMESTAMP,
-             last_daily_bonus TIMESTAMP,
-             daily_streak INTEGER DEFAULT 0,
-             PRIMARY KEY (user_id, chat_id))
-        ''')
-        
-        # Создание таблицы для хранения истории изменений
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS vibe_history
-            (id INTEGER PRIMARY KEY AUTOINCREMENT,
-             user_id INTEGER,
-             chat_id INTEGER,
-             change_amount INTEGER,
-             note TEXT,
-             timestamp TIMESTAMP,
-             FOREIGN KEY (user_id, chat_id) REFERENCES user_vibes(user_id, chat_id))
-        ''')
-        
-        # Новые таблицы
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS achievements
-            (user_id INTEGER,
-             chat_id INTEGER,
-             achievement_id TEXT,
-             achieved_at TIMESTAMP,
-             PRIMARY KEY (user_id, chat_id, achievement_id),
-             FOREIGN KEY (user_id, chat_id) REFERENCES user_vibes(user_id, chat_id))
-        ''')
-        
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS vibe_transfers
-            (id INTEGER PRIMARY KEY AUTOINCREMENT,
-             from_user_id INTEGER,
-             to_user_id INTEGER,
-             chat_id INTEGER,
-             amount INTEGER,
-             timestamp TIMESTAMP,
-             FOREIGN KEY (from_user_id, chat_id) REFERENCES user_vibes(user_id, chat_id),
-             FOREIGN KEY (to_user_id, chat_id) REFERENCES user_vibes(user_id, chat_id))
-        ''')
-        
-        conn.commit()
-        logging.info("Database initialized successfully")
-    except Exception as e:
-        logging.error(f"Error initializing database: {e}")
-        raise
-    finally:
-        if 'conn' in locals():
-            conn.close()
-
 def get_level_info(vibe_score):
     current_level = 0
     for level, info in sorted(VIBE_LEVELS.items(), reverse=True):
@@ -146,6 +124,19 @@ def get_level_info(vibe_score):
     
     return current_info, None, 100
 
+# Кэш топ-10 по чатам (chat_id -> (время, строки)) и живые рейтинги:
+# chat_id -> {'message_id': ..., 'text': ...}
+top_cache = {}
+live_boards = {}
+dirty_boards = set()
+
+# Вызывается после любой записи, меняющей вайб в чате
+def vibe_changed(chat_id):
+    analytics.invalidate(chat_id)
+    top_cache.pop(chat_id, None)
+    if chat_id in live_boards:
+        dirty_boards.add(chat_id)
+
 # Команда /start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
@@ -159,7 +150,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/levels - информация об уровнях вайба\n"
         "/transfer - передать вайб другому пользователю\n"
         "/achievements - посмотреть свои достижения\n"
-        "/daily - получить ежедневный бонус"
+        "/daily - получить ежедневный бонус\n"
+        "/stats - статистика чата (/stats chart - с графиком)\n"
+        "/liveboard - включить или выключить живой рейтинг (для администраторов)"
     )
 
 # Добавление вайба
@@ -310,6 +303,8 @@ async def update_vibe(update: Update, context: ContextTypes.DEFAULT_TYPE, note:
         
         conn.commit()
         conn.close()
+        vibe_changed(vibe_change['chat_id'])
+        context.user_data.pop('vibe_change', None)
         
         # Получаем информацию об уровне
         current_level, next_level, progress = get_level_info(score)
@@ -365,9 +360,14 @@ async def my_vibe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     conn.close()
 
-# Топ пользователей по вайбу
-async def top_vibe(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.message.chat_id
+def top_cache_expired(chat_id):
+    cached = top_cache.get(chat_id)
+    return not cached or monotonic() - cached[0] >= TOP_CACHE_TTL
+
+# Топ-10 чата; до следующего изменения вайба (или TOP_CACHE_TTL) берется из кэша
+def get_top(chat_id):
+    if not top_cache_expired(chat_id):
+        return top_cache[chat_id][1]
     
     conn = sqlite3.connect('vibe_tracker.db')
     c = conn.cursor()
@@ -383,16 +383,115 @@ async def top_vibe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     results = c.fetchall()
     conn.close()
     
+    top_cache.pop(chat_id, None)
+    if len(top_cache) >= TOP_CACHE_MAX_CHATS:
+        top_cache.pop(next(iter(top_cache)))
+    top_cache[chat_id] = (monotonic(), results)
+    return results
+
+def format_top(results):
     if not results:
-        await update.message.reply_text("Пока никто не набрал вайб в этом чате!")
-        return
+        return "Пока никто не набрал вайб в этом чате!"
     
     message = "🏆 Топ пользователей по вайбу:\n\n"
     for i, (username, score) in enumerate(results, 1):
         level_info = get_level_info(score)[0]
         message += f"{i}. {level_info['emoji']} {username}: {score}\n"
+    return message
+
+# Топ пользователей по вайбу
+async def top_vibe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(format_top(get_top(update.message.chat_id)))
+
+# Живой рейтинг: закрепленное сообщение, которое бот редактирует при изменениях
+def load_live_boards():
+    conn = sqlite3.connect('vibe_tracker.db')
+    c = conn.cursor()
+    c.execute('SELECT chat_id, message_id FROM live_leaderboards')
+    for chat_id, message_id in c.fetchall():
+        # Текст после перезапуска неизвестен — сверим его при первом обновлении
+        live_boards[chat_id] = {'message_id': message_id, 'text': None}
+        dirty_boards.add(chat_id)
+    conn.close()
+
+def save_live_board(chat_id, message_id):
+    conn = sqlite3.connect('vibe_tracker.db')
+    c = conn.cursor()
+    if message_id is None:
+        c.execute('DELETE FROM live_leaderboards WHERE chat_id = ?', (chat_id,))
+    else:
+        c.execute('INSERT OR REPLACE INTO live_leaderboards (chat_id, message_id) VALUES (?, ?)',
+                  (chat_id, message_id))
+    conn.commit()
+    conn.close()
+
+async def live_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.message.chat_id
     
-    await update.message.reply_text(message)
+    try:
+        if not await is_chat_admin(update, context):
+            await update.message.reply_text("Живой рейтинг настраивают только администраторы чата.")
+            return
+        
+        board = live_boards.pop(chat_id, None)
+        if board:
+            dirty_boards.discard(chat_id)
+            save_live_board(chat_id, None)
+            try:
+                await context.bot.unpin_chat_message(chat_id, board['message_id'])
+            except BadRequest:
+                pass
+            await update.message.reply_text("Живой рейтинг выключен.")
+            return
+        
+        text = format_top(get_top(chat_id))
+        message = await context.bot.send_message(chat_id, text)
+        live_boards[chat_id] = {'message_id': message.message_id, 'text': text}
+        save_live_board(chat_id, message.message_id)
+        try:
+            await message.pin(disable_notification=True)
+        except BadRequest:
+            await update.message.reply_text("Не удалось закрепить рейтинг: дайте боту право закреплять сообщения.")
+        
+    except Exception as e:
+        logging.error(f"Error in live_leaderboard: {e}")
+        await update.message.reply_text("Произошла ошибка при настройке рейтинга. Попробуйте позже.")
+
+# Периодическая задача: одно редактирование на чат за интервал и только если текст изменился
+async def refresh_live_boards(context: ContextTypes.DEFAULT_TYPE):
+    # Рейтинги с устаревшим кэшем тоже перепроверяем: база могла измениться не через бота
+    chats = dirty_boards | {chat_id for chat_id in live_boards if top_cache_expired(chat_id)}
+    dirty_boards.clear()
+    
+    for chat_id in chats:
+        board = live_boards.get(chat_id)
+        if not board:
+            continue
+        
+        text = format_top(get_top(chat_id))
+        if text == board['text']:
+            continue
+        
+        try:
+            await context.bot.edit_message_text(text, chat_id=chat_id, message_id=board['message_id'])
+            board['text'] = text
+        except BadRequest as e:
+            if 'not modified' in str(e):
+                board['text'] = text
+            else:
+                # Сообщение удалено или недоступно — выключаем рейтинг
+                logging.warning(f"Disabling live leaderboard in chat {chat_id}: {e}")
+                live_boards.pop(chat_id, None)
+                save_live_board(chat_id, None)
+        except (Forbidden, ChatMigrated) as e:
+            # Бота удалили из чата или группа стала супергруппой с новым id —
+            # повторять редактирование бесполезно
+            logging.warning(f"Disabling live leaderboard in chat {chat_id}: {e}")
+            live_boards.pop(chat_id, None)
+            save_live_board(chat_id, None)
+        except Exception as e:
+            logging.error(f"Error in refresh_live_boards: {e}")
+            dirty_boards.add(chat_id)
 
 # История изменений вайба
 async def vibe_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -502,6 +601,7 @@ async def transfer_vibe_target(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return WAITING_FOR_TRANSFER_TARGET
     
+    context.user_data.pop('transfer_amount', None)
     if target_user.id == update.message.from_user.id:
         await update.message.reply_text("Вы не можете передать вайб самому себе!")
         return ConversationHandler.END
@@ -538,6 +638,7 @@ async def transfer_vibe(update: Update, context: ContextTypes.DEFAULT_TYPE, targ
         ''', (update.message.from_user.id, target_user.id, update.message.chat_id, amount, datetime.now()))
         
         conn.commit()
+        vibe_changed(update.message.chat_id)
         
         # Проверяем достижение social_butterfly
         c.execute('''
@@ -633,6 +734,7 @@ async def daily_bonus(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ''', (user_id, chat_id, bonus_amount, f"Ежедневный бонус (стрик: {streak})", now))
         
         conn.commit()
+        vibe_changed(chat_id)
         
         # Проверяем достижение daily_streak
         if streak >= 5:
@@ -686,6 +788,7 @@ async def check_and_grant_achievement(update: Update, context: ContextTypes.DEFA
         ''', (achievement['reward'], update.message.from_user.id, update.message.chat_id))
         
         conn.commit()
+        vibe_changed(update.message.chat_id)
         
         # Уведомляем пользователя
         message = f"🎉 Получено достижение!\n\n"
@@ -739,12 +842,339 @@ async def show_achievements(update: Update, context: ContextTypes.DEFAULT_TYPE):
     finally:
         conn.close()
 
-def main():
-    # Инициализация базы данных
-    init_db()
+# Статистика чата
+async def chat_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.message.chat_id
+    chart = bool(context.args) and context.args[0].lower() == 'chart'
     
-    # Создание и настройка бота
-    application = Application.builder().token(TOKEN).build()
+    try:
+        # Расчет идет в отдельном потоке, чтобы не задерживать остальные обновления
+        stats = await asyncio.to_thread(analytics.get_stats, chat_id)
+        
+        user_ids = {user_id for rows in (stats['active'], stats['givers'], stats['receivers'])
+                    for user_id, _ in rows}
+        names = {}
+        if user_ids:
+            conn = sqlite3.connect('vibe_tracker.db')
+            c = conn.cursor()
+            c.execute(f'''
+                SELECT user_id, username FROM user_vibes
+                WHERE chat_id = ? AND user_id IN ({', '.join('?' for _ in user_ids)})
+            ''', (chat_id, *user_ids))
+            names = dict(c.fetchall())
+            conn.close()
+        
+        await update.message.reply_text(analytics.format_stats(stats, names, chart))
+        
+    except analytics.StatsTimeout:
+        await update.message.reply_text("Статистика считается слишком долго. Попробуйте позже.")
+    except Exception as e:
+        logging.error(f"Error in chat_stats: {e}")
+        await update.message.reply_text("Произошла ошибка при подсчете статистики. Попробуйте позже.")
+
+async def is_chat_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.message.chat.type == 'private':
+        return True
+    member = await context.bot.get_chat_member(update.message.chat_id, update.message.from_user.id)
+    return member.status in ('administrator', 'creator')
+
+# Экспорт данных чата (только для администраторов)
+async def export_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.message.chat_id
+    fmt = context.args[0].lower() if context.args else 'jsonl'
+    if fmt not in vibe_export.FORMATS:
+        await update.message.reply_text("Доступные форматы: jsonl, csv")
+        return
+    
+    try:
+        if not await is_chat_admin(update, context):
+            await update.message.reply_text("Экспорт доступен только администраторам чата.")
+            return
+        
+        with tempfile.TemporaryDirectory() as out_dir:
+            # Выгрузка идет потоково, но это все равно работа с диском — уносим ее из event loop
+            counts = await asyncio.to_thread(vibe_export.export_data, out_dir, chat_id, fmt)
+            for table in vibe_export.TABLES:
+                filename = vibe_export.table_filename(table, fmt)
+                with open(os.path.join(out_dir, filename), 'rb') as f:
+                    await update.message.reply_document(f, filename=filename,
+                                                        caption=f"{table}: {counts[table]} строк")
+        
+    except Exception as e:
+        logging.error(f"Error in export_chat: {e}")
+        await update.message.reply_text("Произошла ошибка при экспорте данных. Попробуйте позже.")
+
+# Отмена и таймаут диалогов: данные незавершенного действия больше не нужны
+async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data.pop('vibe_change', None)
+    context.user_data.pop('transfer_amount', None)
+    return ConversationHandler.END
+
+# Контроль нагрузки: тяжелые чтения уступают место изменениям вайба
+admission_controller = admission.AdmissionController(
+    ADMISSION_CONCURRENCY, ADMISSION_QUEUE_LIMITS, ADMISSION_LATENCY_TARGET)
+
+def update_priority(update):
+    message = getattr(update, 'message', None)
+    if message and message.text and message.text.startswith('/'):
+        command = message.text.split()[0][1:].split('@')[0].lower()
+        if command in HEAVY_COMMANDS:
+            return admission.LOW
+    return admission.HIGH
+
+async def reply_busy(update):
+    text = "⏳ Бот сейчас перегружен, попробуйте чуть позже."
+    if update.callback_query:
+        await update.callback_query.answer(text)
+    elif update.effective_message:
+        await update.effective_message.reply_text(text)
+
+# Очистка состояния неактивных пользователей и чатов
+last_seen_users = {}
+last_seen_chats = {}
+memory_stats = {}
+
+async def track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    now = monotonic()
+    if update.effective_user:
+        last_seen_users[update.effective_user.id] = now
+    if update.effective_chat:
+        last_seen_chats[update.effective_chat.id] = now
+
+def deep_sizeof(obj, seen=None):
+    """Приблизительный размер объекта в байтах вместе с вложенными контейнерами."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, Mapping):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+def resident_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+def memory_report(application: Application):
+    containers = {
+        'user_data': application.user_data,
+        'chat_data': application.chat_data,
+        'last_seen_users': last_seen_users,
+        'last_seen_chats': last_seen_chats,
+        'top_cache': top_cache,
+        'live_boards': live_boards,
+        'stats_cache': analytics.cache_entries(),
+    }
+    report = {name: {'entries': len(data), 'bytes': deep_sizeof(data)}
+              for name, data in containers.items()}
+    report['rss_bytes'] = resident_bytes()
+    return report
+
+def evict_idle(data, last_seen, drop, now):
+    evicted = 0
+    for key in list(data):
+        # Для ключей без отметки (например, после перезапуска) отсчет начинается сейчас
+        if now - last_seen.setdefault(key, now) > USER_DATA_TTL:
+            drop(key)
+            evicted += 1
+    for key in [key for key, seen in last_seen.items() if now - seen > USER_DATA_TTL]:
+        del last_seen[key]
+    return evicted
+
+async def sweep_idle_state(context: ContextTypes.DEFAULT_TYPE):
+    application = context.application
+    now = monotonic()
+    users = evict_idle(application.user_data, last_seen_users, application.drop_user_data, now)
+    chats = evict_idle(application.chat_data, last_seen_chats, application.drop_chat_data, now)
+    
+    # Новый отчет подменяет старый одним присваиванием: /health читает его из другого потока
+    global memory_stats
+    memory_stats = memory_report(application)
+    logging.info(f"Evicted idle state for {users} users and {chats} chats, memory: {memory_stats}")
+    logging.info(f"Admission control: {admission_controller.stats()}")
+
+# Запуск: время каждого этапа, снимок кэшей и проверка готовности
+startup_timings = {}
+startup_state = {'ready': False, 'first_reply': False}
+
+@contextmanager
+def startup_phase(name):
+    started = perf_counter()
+    yield
+    startup_timings[name] = round(perf_counter() - started, 4)
+
+def db_signature(db_path='vibe_tracker.db'):
+    # В режиме WAL свежие записи лежат в файле -wal до контрольной точки
+    signature = []
+    for path in (db_path, db_path + '-wal'):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature += [stat.st_mtime_ns, stat.st_size]
+    return signature
+
+def save_snapshot():
+    if not SNAPSHOT_PATH:
+        return
+    try:
+        snapshot = {
+            'db': db_signature(),
+            'top': {str(chat_id): rows for chat_id, (_, rows) in top_cache.items()},
+            # Рейтинги с неотправленными изменениями не сохраняем — их текст устарел
+            'boards': {str(chat_id): board['text'] for chat_id, board in live_boards.items()
+                       if chat_id not in dirty_boards and board['text']},
+        }
+        with open(SNAPSHOT_PATH + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(SNAPSHOT_PATH + '.tmp', SNAPSHOT_PATH)
+        logging.info(f"Saved cache snapshot to {SNAPSHOT_PATH}")
+    except Exception as e:
+        logging.error(f"Error in save_snapshot: {e}")
+
+def load_snapshot():
+    if not SNAPSHOT_PATH or not os.path.exists(SNAPSHOT_PATH):
+        return
+    try:
+        with open(SNAPSHOT_PATH, encoding='utf-8') as f:
+            snapshot = json.load(f)
+        # Снимок годится, только если база не менялась после его записи
+        if snapshot['db'] != db_signature():
+            logging.info("Cache snapshot is stale, starting with cold caches")
+            return
+        
+        for chat_id, rows in snapshot['top'].items():
+            top_cache[int(chat_id)] = (monotonic(), [tuple(row) for row in rows])
+        for chat_id, text in snapshot['boards'].items():
+            board = live_boards.get(int(chat_id))
+            if board:
+                board['text'] = text
+                dirty_boards.discard(int(chat_id))
+        logging.info(f"Loaded cache snapshot: {len(snapshot['top'])} leaderboards")
+    except Exception as e:
+        logging.error(f"Error in load_snapshot: {e}")
+
+def startup_report():
+    return {'ready': startup_state['ready'], 'timings': startup_timings, 'memory': memory_stats,
+            'admission': admission_controller.stats()}
+
+class HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/ready':
+            status = 200 if startup_state['ready'] else 503
+        elif self.path == '/health':
+            status = 200
+        else:
+            self.send_error(404)
+            return
+        
+        body = json.dumps(startup_report()).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_health_server(port):
+    server = ThreadingHTTPServer(('0.0.0.0', port), HealthHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Health server listening on port {port}")
+
+def mark_ready():
+    startup_timings['ready'] = round(perf_counter() - PROCESS_START, 4)
+    startup_state['ready'] = True
+    logging.info(f"Bot is ready, startup timings: {startup_timings}")
+
+async def ready_job(context: ContextTypes.DEFAULT_TYPE):
+    mark_ready()
+
+async def on_startup(application: Application):
+    # post_init вызывается до запуска опроса, а задачи job_queue выполняются только
+    # после application.start(), когда бот уже получает обновления
+    application.job_queue.run_once(ready_job, 0, job_kwargs={'misfire_grace_time': None})
+
+async def on_shutdown(application: Application):
+    save_snapshot()
+
+# Стоит в последней группе, поэтому срабатывает после того, как основной обработчик ответил
+async def track_first_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if startup_state['first_reply']:
+        return
+    startup_state['first_reply'] = True
+    startup_timings['first_reply'] = round(perf_counter() - PROCESS_START, 4)
+    logging.info(f"First update handled {startup_timings['first_reply']} s after process start")
+
+# Заглушка Bot API для --startup-bench: отвечает на запросы бота без сети
+# и запоминает момент первого отправленного сообщения
+class BenchRequest(BaseRequest):
+    def __init__(self):
+        self.replied_at = None
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
+    
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        if endpoint == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        elif endpoint == 'sendMessage':
+            if self.replied_at is None:
+                self.replied_at = perf_counter()
+            params = request_data.parameters
+            result = {'message_id': 1, 'date': 0, 'text': params.get('text', ''),
+                      'chat': {'id': params['chat_id'], 'type': 'private'}}
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+# Прогон одного синтетического /myvibe через обработчики: время до первого ответа
+async def run_startup_bench(application: Application, request: BenchRequest):
+    with startup_phase('initialize'):
+        await application.initialize()
+        # Бенчмарк передает обновление напрямую, без опроса, так что бот готов сразу
+        mark_ready()
+    
+    user = {'id': 2, 'is_bot': False, 'first_name': 'bench'}
+    update = Update.de_json({
+        'update_id': 1,
+        'message': {
+            'message_id': 1,
+            'date': int(datetime.now().timestamp()),
+            'chat': {'id': 2, 'type': 'private'},
+            'from': user,
+            'text': '/myvibe',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 7}],
+        },
+    }, application.bot)
+    
+    started = perf_counter()
+    await application.update_processor.process_update(update, application.process_update(update))
+    if request.replied_at is None:
+        raise RuntimeError("Benchmark update produced no reply")
+    startup_timings['reply'] = round(request.replied_at - started, 4)
+    startup_timings['first_reply'] = round(request.replied_at - PROCESS_START, 4)
+    await application.shutdown()
+
+def build_application(token, request=None):
+    # Обновления разных пользователей обрабатываются параллельно, одного — по очереди;
+    # порядок и число одновременных обновлений определяет admission_controller
+    update_processor = admission.AdmissionUpdateProcessor(admission_controller, update_priority, reply_busy)
+    builder = (Application.builder().token(token).concurrent_updates(update_processor)
+               .post_init(on_startup).post_shutdown(on_shutdown))
+    if request:
+        builder = builder.request(request)
+    application = builder.build()
     
     # Создание обработчика разговора для заметок
     note_conv_handler = ConversationHandler(
@@ -752,7 +1182,7 @@ def main():
         states={
             WAITING_FOR_NOTE: [MessageHandler(filters.TEXT & ~filters.COMMAND, note_handler)]
         },
-        fallbacks=[CommandHandler('cancel', lambda u, c: ConversationHandler.END)]
+        fallbacks=[CommandHandler('cancel', cancel_conversation)]
     )
     
     # Создание обработчика разговора для передачи вайба
@@ -760,11 +1190,16 @@ def main():
         entry_points=[CommandHandler('transfer', transfer_vibe_start)],
         states={
             WAITING_FOR_TRANSFER_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, transfer_vibe_amount)],
-            WAITING_FOR_TRANSFER_TARGET: [MessageHandler(filters.TEXT | filters.FORWARDED, transfer_vibe_target)]
+            WAITING_FOR_TRANSFER_TARGET: [MessageHandler(filters.TEXT | filters.FORWARDED, transfer_vibe_target)],
+            ConversationHandler.TIMEOUT: [TypeHandler(Update, cancel_conversation)]
         },
-        fallbacks=[CommandHandler('cancel', lambda u, c: ConversationHandler.END)]
+        fallbacks=[CommandHandler('cancel', cancel_conversation)],
+        conversation_timeout=CONVERSATION_TIMEOUT
     )
     
+    # Отметка активности — до всех остальных обработчиков
+    application.add_handler(TypeHandler(Update, track_activity), group=-1)
+    
     # Добавление обработчиков команд в правильном порядке
     application.add_handler(CommandHandler("plusvibe", plus_vibe))
     application.add_handler(CommandHandler("minusvibe", minus_vibe))
@@ -778,6 +1213,42 @@ def main():
     application.add_handler(CommandHandler("levels", levels_info))
     application.add_handler(CommandHandler("daily", daily_bonus))
     application.add_handler(CommandHandler("achievements", show_achievements))
+    application.add_handler(CommandHandler("stats", chat_stats))
+    application.add_handler(CommandHandler("export", export_chat))
+    application.add_handler(CommandHandler("liveboard", live_leaderboard))
+    
+    application.add_handler(TypeHandler(Update, track_first_reply), group=1)
+    
+    application.job_queue.run_repeating(refresh_live_boards, interval=LIVE_LEADERBOARD_INTERVAL,
+                                        first=LIVE_LEADERBOARD_INTERVAL)
+    application.job_queue.run_repeating(sweep_idle_state, interval=SWEEP_INTERVAL, first=SWEEP_INTERVAL)
+    return application
+
+def main():
+    startup_timings['imports'] = round(perf_counter() - PROCESS_START, 4)
+    # Замер запуска без подключения к Telegram: python3 bot.py --startup-bench
+    bench = '--startup-bench' in sys.argv
+    
+    # Инициализация базы данных
+    with startup_phase('init_db'):
+        db.init_db()
+    
+    with startup_phase('load_state'):
+        load_live_boards()
+        load_snapshot()
+    
+    # Создание и настройка бота
+    request = BenchRequest() if bench else None
+    with startup_phase('handlers'):
+        application = build_application(TOKEN or ('0:startup-bench' if bench else None), request)
+    
+    if bench:
+        asyncio.run(run_startup_bench(application, request))
+        print(json.dumps(startup_timings, indent=2))
+        return
+    
+    if HEALTH_PORT:
+        start_health_server(int(HEALTH_PORT))
     
     # Запуск бота
     application.run_polling()
@@ -0,0 +1,161 @@
+import sqlite3
+import logging
+
+import analytics
+
+DB_PATH = 'vibe_tracker.db'
+
+# Версия схемы в PRAGMA user_version; увеличивайте при любом изменении DDL в init_db
+SCHEMA_VERSION = 1
+
+# Инициализация базы данных
+def init_db(db_path=DB_PATH):
+    try:
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        
+        # WAL: долгие чтения (например, экспорт) не блокируют запись из обработчиков.
+        # Режим сохраняется в файле базы, но включаем его до проверки версии,
+        # чтобы он применился и к уже созданным базам
+        c.execute('PRAGMA journal_mode=WAL')
+        
+        # Схема уже актуальна — DDL не нужен
+        c.execute('PRAGMA user_version')
+        if c.fetchone()[0] == SCHEMA_VERSION:
+            logging.info("Database schema is up to date")
+            return
+        
+        # Создание таблицы для хранения вайба пользователей
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS user_vibes
+            (user_id INTEGER,
+             chat_id INTEGER,
+             username TEXT,
+             vibe_score INTEGER DEFAULT 0,
+             last_update TIMESTAMP,
+             last_daily_bonus TIMESTAMP,
+             daily_streak INTEGER DEFAULT 0,
+             PRIMARY KEY (user_id, chat_id))
+        ''')
+        
+        # Создание таблицы для хранения истории изменений
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS vibe_history
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             user_id INTEGER,
+             chat_id INTEGER,
+             change_amount INTEGER,
+             note TEXT,
+             timestamp TIMESTAMP,
+             FOREIGN KEY (user_id, chat_id) REFERENCES user_vibes(user_id, chat_id))
+        ''')
+        
+        # Новые таблицы
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS achievements
+            (user_id INTEGER,
+             chat_id INTEGER,
+             achievement_id TEXT,
+             achieved_at TIMESTAMP,
+             PRIMARY KEY (user_id, chat_id, achievement_id),
+             FOREIGN KEY (user_id, chat_id) REFERENCES user_vibes(user_id, chat_id))
+        ''')
+        
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS vibe_transfers
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             from_user_id INTEGER,
+             to_user_id INTEGER,
+             chat_id INTEGER,
+             amount INTEGER,
+             timestamp TIMESTAMP,
+             FOREIGN KEY (from_user_id, chat_id) REFERENCES user_vibes(user_id, chat_id),
+             FOREIGN KEY (to_user_id, chat_id) REFERENCES user_vibes(user_id, chat_id))
+        ''')
+        
+        # Выборки одного чата (экспорт, /history) без полного просмотра таблиц
+        c.execute('CREATE INDEX IF NOT EXISTS idx_vibe_history_chat ON vibe_history (chat_id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_vibe_transfers_chat ON vibe_transfers (chat_id)')
+        
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS live_leaderboards
+            (chat_id INTEGER PRIMARY KEY,
+             message_id INTEGER)
+        ''')
+        
+        # Дневные итоги для статистики: их ведут триггеры, так что они совпадают
+        # с историей при любой записи, включая импорт
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vibe_history_daily'")
+        rollups_exist = c.fetchone() is not None
+        
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS vibe_history_daily
+            (chat_id INTEGER,
+             day INTEGER NOT NULL,
+             user_id INTEGER,
+             total INTEGER,
+             changes INTEGER,
+             PRIMARY KEY (chat_id, day, user_id))
+        ''')
+        
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS vibe_transfers_daily
+            (chat_id INTEGER,
+             day INTEGER NOT NULL,
+             from_user_id INTEGER,
+             to_user_id INTEGER,
+             amount INTEGER,
+             PRIMARY KEY (chat_id, day, from_user_id, to_user_id))
+        ''')
+        
+        # Строки без даты (например, пустой timestamp из CSV) ни к какому дню не относятся
+        if not rollups_exist:
+            c.execute(f'''
+                INSERT INTO vibe_history_daily (chat_id, day, user_id, total, changes)
+                SELECT chat_id, {analytics.day_sql('timestamp')}, user_id, SUM(change_amount), COUNT(*)
+                FROM vibe_history
+                WHERE {analytics.day_sql('timestamp')} IS NOT NULL
+                GROUP BY 1, 2, 3
+            ''')
+            c.execute(f'''
+                INSERT INTO vibe_transfers_daily (chat_id, day, from_user_id, to_user_id, amount)
+                SELECT chat_id, {analytics.day_sql('timestamp')}, from_user_id, to_user_id, SUM(amount)
+                FROM vibe_transfers
+                WHERE {analytics.day_sql('timestamp')} IS NOT NULL
+                GROUP BY 1, 2, 3, 4
+            ''')
+        
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_vibe_history_daily
+            AFTER INSERT ON vibe_history
+            WHEN {analytics.day_sql('NEW.timestamp')} IS NOT NULL
+            BEGIN
+                INSERT INTO vibe_history_daily (chat_id, day, user_id, total, changes)
+                VALUES (NEW.chat_id, {analytics.day_sql('NEW.timestamp')}, NEW.user_id, NEW.change_amount, 1)
+                ON CONFLICT(chat_id, day, user_id) DO UPDATE SET
+                total = total + excluded.total,
+                changes = changes + 1;
+            END
+        ''')
+        
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_vibe_transfers_daily
+            AFTER INSERT ON vibe_transfers
+            WHEN {analytics.day_sql('NEW.timestamp')} IS NOT NULL
+            BEGIN
+                INSERT INTO vibe_transfers_daily (chat_id, day, from_user_id, to_user_id, amount)
+                VALUES (NEW.chat_id, {analytics.day_sql('NEW.timestamp')}, NEW.from_user_id, NEW.to_user_id, NEW.amount)
+                ON CONFLICT(chat_id, day, from_user_id, to_user_id) DO UPDATE SET
+                amount = amount + excluded.amount;
+            END
+        ''')
+        
+        c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+        logging.info("Database initialized successfully")
+    except Exception as e:
+        logging.error(f"Error initializing database: {e}")
+        raise
+    finally:
+        if 'conn' in locals():
+            conn.close()
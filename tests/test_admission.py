@@ -0,0 +1,222 @@
+import asyncio
+from time import monotonic
+from types import SimpleNamespace
+
+import pytest
+
+import admission
+
+
+def make_controller(max_concurrency=1, latency_target=0.05):
+    return admission.AdmissionController(
+        max_concurrency, {admission.HIGH: 10, admission.LOW: 2}, latency_target)
+
+
+def test_high_priority_is_dispatched_first():
+    async def scenario():
+        controller = make_controller(latency_target=1)
+        order = []
+
+        async def request(name, priority):
+            if await controller.acquire(priority):
+                order.append(name)
+                controller.release()
+
+        assert await controller.acquire(admission.HIGH)
+        low = asyncio.create_task(request('low', admission.LOW))
+        high = asyncio.create_task(request('high', admission.HIGH))
+        await asyncio.sleep(0)
+        controller.release()
+        await asyncio.gather(low, high)
+        return order
+
+    assert asyncio.run(scenario()) == ['high', 'low']
+
+
+def test_low_priority_is_shed_at_deadline_under_steady_load():
+    async def scenario():
+        controller = make_controller()
+        assert await controller.acquire(admission.HIGH)
+        started = monotonic()
+        admitted = await controller.acquire(admission.LOW)
+        return admitted, monotonic() - started, controller
+
+    admitted, waited, controller = asyncio.run(scenario())
+    assert admitted is False
+    assert waited == pytest.approx(0.05, abs=0.04)
+    assert not controller.queues[admission.LOW]
+    assert controller.counters[admission.LOW] == {'admitted': 0, 'queued': 1, 'shed': 1}
+
+
+def test_full_queue_is_shed_immediately():
+    async def scenario():
+        controller = make_controller(latency_target=1)
+        assert await controller.acquire(admission.HIGH)
+        waiting = [asyncio.create_task(controller.acquire(admission.LOW)) for _ in range(2)]
+        await asyncio.sleep(0)
+        admitted = await controller.acquire(admission.LOW)
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+        return admitted
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        controller = make_controller(latency_target=1)
+        assert await controller.acquire(admission.HIGH)
+        waiter = asyncio.create_task(controller.acquire(admission.HIGH))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        controller.release()
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.active == 0
+    assert not controller.queues[admission.HIGH]
+
+
+def test_cancelled_after_admission_returns_slot():
+    async def scenario():
+        controller = make_controller(latency_target=1)
+        assert await controller.acquire(admission.HIGH)
+        waiter = asyncio.create_task(controller.acquire(admission.HIGH))
+        await asyncio.sleep(0)
+        # Место передается ожидающему, но он отменяется до того, как проснулся
+        controller.release()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.active == 0
+
+
+def make_update(user_id, priority):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), effective_chat=None,
+                           priority=priority)
+
+
+def make_processor(controller, shed):
+    async def on_shed(update):
+        shed.append(update)
+
+    return admission.AdmissionUpdateProcessor(controller, lambda update: update.priority, on_shed)
+
+
+def test_updates_of_one_user_keep_their_order():
+    async def scenario():
+        controller = make_controller(latency_target=1)
+        processor = make_processor(controller, [])
+        order = []
+
+        async def handle(name, delay=0):
+            await asyncio.sleep(delay)
+            order.append(name)
+
+        # Пока чужое обновление занимает место, LOW-команда пользователя ждет в очереди;
+        # его следующее сообщение (HIGH) не должно ее обогнать
+        tasks = [
+            asyncio.create_task(processor.process_update(make_update(2, admission.HIGH), handle('other', 0.02))),
+            asyncio.create_task(processor.process_update(make_update(1, admission.LOW), handle('command'))),
+            asyncio.create_task(processor.process_update(make_update(1, admission.HIGH), handle('reply'))),
+        ]
+        await asyncio.gather(*tasks)
+        return order, processor
+
+    order, processor = asyncio.run(scenario())
+    assert order == ['other', 'command', 'reply']
+    assert not processor.controller._pending
+    assert not processor.controller._running
+
+
+def test_shed_update_gets_busy_reply_and_is_not_run():
+    async def scenario():
+        controller = make_controller()
+        shed = []
+        processor = make_processor(controller, shed)
+        ran = []
+
+        async def handle(name, delay=0):
+            await asyncio.sleep(delay)
+            ran.append(name)
+
+        tasks = [
+            asyncio.create_task(processor.process_update(make_update(2, admission.HIGH), handle('other', 0.2))),
+            asyncio.create_task(processor.process_update(make_update(1, admission.LOW), handle('command'))),
+        ]
+        await asyncio.gather(*tasks)
+        return ran, shed
+
+    ran, shed = asyncio.run(scenario())
+    assert ran == ['other']
+    assert len(shed) == 1
+
+
+def test_all_pending_updates_are_visible_to_controller():
+    async def scenario():
+        controller = admission.AdmissionController(1, {admission.HIGH: 1000, admission.LOW: 2}, 1)
+        processor = make_processor(controller, [])
+        release = asyncio.Event()
+
+        async def handle():
+            await release.wait()
+
+        tasks = [asyncio.create_task(processor.process_update(make_update(user_id, admission.HIGH), handle()))
+                 for user_id in range(400)]
+        await asyncio.sleep(0.01)
+        stats = controller.stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats['active'] == 1
+    assert stats['queues']['high']['waiting'] == 399
+
+
+def test_flooding_user_does_not_block_others():
+    async def scenario():
+        controller = admission.AdmissionController(2, {admission.HIGH: 1000, admission.LOW: 2}, 1)
+        processor = make_processor(controller, [])
+        order = []
+
+        async def handle(name):
+            await asyncio.sleep(0.001)
+            order.append(name)
+
+        tasks = [asyncio.create_task(processor.process_update(make_update(1, admission.HIGH), handle('flood')))
+                 for _ in range(300)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(processor.process_update(make_update(2, admission.HIGH), handle('other'))))
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    assert order.index('other') <= 1
+
+
+def test_deadline_counts_time_waiting_behind_same_user():
+    async def scenario():
+        controller = make_controller(max_concurrency=4)
+        shed = []
+        processor = make_processor(controller, shed)
+
+        async def handle(delay=0):
+            await asyncio.sleep(delay)
+
+        slow = asyncio.create_task(processor.process_update(make_update(1, admission.HIGH), handle(0.3)))
+        await asyncio.sleep(0)
+        started = monotonic()
+        await processor.process_update(make_update(1, admission.LOW), handle())
+        waited = monotonic() - started
+        await slow
+        return waited, shed, controller
+
+    waited, shed, controller = asyncio.run(scenario())
+    assert len(shed) == 1
+    assert waited == pytest.approx(0.05, abs=0.04)
+    assert controller.stats()['queues']['low']['shed'] == 1
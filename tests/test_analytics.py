@@ -0,0 +1,87 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import analytics
+import db
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = str(tmp_path / 'vibe_tracker.db')
+    db.init_db(path)
+    yield path
+    analytics._cache.clear()
+    analytics._computing.clear()
+
+
+def add_history(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executemany('''
+        INSERT INTO vibe_history (user_id, chat_id, change_amount, note, timestamp)
+        VALUES (?, ?, ?, NULL, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+
+def test_stats_match_history(db_file):
+    today = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
+    add_history(db_file, [
+        (1, 5, 3, today),
+        (1, 5, 2, today - timedelta(days=1)),
+        (2, 5, -1, today - timedelta(days=1)),
+        (2, 5, 10, today - timedelta(days=40)),
+        (3, 6, 7, today),
+    ])
+    conn = sqlite3.connect(db_file)
+    conn.execute('''
+        INSERT INTO vibe_transfers (from_user_id, to_user_id, chat_id, amount, timestamp)
+        VALUES (1, 2, 5, 4, ?), (1, 2, 5, 6, ?)
+    ''', (today, today))
+    conn.commit()
+    conn.close()
+
+    stats = analytics.compute_stats(5, db_path=db_file)
+
+    assert stats['changes'] == 3
+    assert stats['total'] == 4
+    assert list(stats['daily'][-2:]) == [1, 3]
+    assert stats['active'] == [(1, 2), (2, 1)]
+    assert stats['givers'] == [(1, 10)]
+    assert stats['receivers'] == [(2, 10)]
+
+
+def test_write_during_calculation_is_not_cached(db_file, monkeypatch):
+    compute_stats = analytics.compute_stats
+
+    def compute_with_concurrent_write(*args, **kwargs):
+        stats = compute_stats(*args, **kwargs)
+        add_history(db_file, [(1, 5, 1, datetime.now())])
+        analytics.invalidate(5)
+        return stats
+
+    monkeypatch.setattr(analytics, 'compute_stats', compute_with_concurrent_write)
+    assert analytics.get_stats(5, db_path=db_file)['changes'] == 0
+
+    monkeypatch.setattr(analytics, 'compute_stats', compute_stats)
+    assert analytics.get_stats(5, db_path=db_file)['changes'] == 1
+
+
+def test_invalidated_chats_leave_no_state(db_file):
+    analytics.get_stats(5, db_path=db_file)
+    for chat_id in range(1000):
+        analytics.invalidate(chat_id)
+
+    assert not analytics._cache
+    assert not analytics._computing
+
+
+def test_rows_without_date_are_not_rolled_up(db_file):
+    add_history(db_file, [(1, 5, 3, None), (1, 5, 2, 'garbage'), (1, 5, 1, None)])
+
+    conn = sqlite3.connect(db_file)
+    assert conn.execute('SELECT COUNT(*) FROM vibe_history').fetchone()[0] == 3
+    assert conn.execute('SELECT COUNT(*) FROM vibe_history_daily').fetchone()[0] == 0
+    conn.close()
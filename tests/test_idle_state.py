@@ -0,0 +1,23 @@
+import asyncio
+from types import SimpleNamespace
+
+import bot
+
+
+def test_sweeper_evicts_idle_user_data(monkeypatch):
+    application = bot.build_application('0:test')
+    for user_id in range(100):
+        application.user_data[user_id]['vibe_change'] = {'amount': 1}
+    application.chat_data[5]['key'] = 'value'
+    context = SimpleNamespace(application=application)
+
+    asyncio.run(bot.sweep_idle_state(context))
+    assert len(application.user_data) == 100
+    assert bot.memory_stats['user_data']['entries'] == 100
+
+    monkeypatch.setattr(bot, 'USER_DATA_TTL', -1)
+    asyncio.run(bot.sweep_idle_state(context))
+    assert len(application.user_data) == 0
+    assert len(application.chat_data) == 0
+    assert not bot.last_seen_users
+    assert bot.memory_stats['stats_cache']['entries'] == 0
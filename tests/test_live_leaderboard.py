@@ -0,0 +1,92 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import ChatMigrated, Forbidden
+
+import bot
+import db
+
+
+class FakeBot:
+    def __init__(self):
+        self.edits = []
+        self.error = None
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.edits.append(text)
+        if self.error:
+            raise self.error
+
+
+@pytest.fixture
+def board(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db.init_db()
+    conn = sqlite3.connect('vibe_tracker.db')
+    conn.execute("INSERT INTO user_vibes (user_id, chat_id, username, vibe_score) VALUES (1, 5, 'a', 3)")
+    conn.commit()
+    conn.close()
+
+    bot.top_cache.clear()
+    bot.live_boards.clear()
+    bot.dirty_boards.clear()
+    bot.save_live_board(5, 42)
+    bot.load_live_boards()
+    context = SimpleNamespace(bot=FakeBot())
+    asyncio.run(bot.refresh_live_boards(context))
+    yield context
+    bot.top_cache.clear()
+    bot.live_boards.clear()
+    bot.dirty_boards.clear()
+
+
+def add_vibe(amount):
+    conn = sqlite3.connect('vibe_tracker.db')
+    conn.execute('UPDATE user_vibes SET vibe_score = vibe_score + ? WHERE chat_id = 5', (amount,))
+    conn.commit()
+    conn.close()
+
+
+def test_burst_of_changes_is_one_edit(board):
+    for _ in range(100):
+        add_vibe(1)
+        bot.vibe_changed(5)
+    asyncio.run(bot.refresh_live_boards(board))
+
+    assert len(board.bot.edits) == 2
+    assert 'a: 103' in board.bot.edits[-1]
+
+
+def test_unchanged_text_is_not_sent(board):
+    bot.vibe_changed(5)
+    asyncio.run(bot.refresh_live_boards(board))
+
+    assert len(board.bot.edits) == 1
+
+
+def test_external_write_is_picked_up_after_ttl(board, monkeypatch):
+    add_vibe(10)
+    asyncio.run(bot.refresh_live_boards(board))
+    assert len(board.bot.edits) == 1
+
+    monkeypatch.setattr(bot, 'TOP_CACHE_TTL', 0)
+    asyncio.run(bot.refresh_live_boards(board))
+    assert 'a: 13' in board.bot.edits[-1]
+
+
+@pytest.mark.parametrize('error', [Forbidden('bot was kicked'), ChatMigrated(-1005)])
+def test_lost_chat_disables_board(board, error):
+    board.bot.error = error
+    add_vibe(1)
+    bot.vibe_changed(5)
+    asyncio.run(bot.refresh_live_boards(board))
+
+    assert 5 not in bot.live_boards
+    bot.vibe_changed(5)
+    asyncio.run(bot.refresh_live_boards(board))
+    assert len(board.bot.edits) == 2
+    conn = sqlite3.connect('vibe_tracker.db')
+    assert conn.execute('SELECT COUNT(*) FROM live_leaderboards').fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,50 @@
+import asyncio
+import sqlite3
+
+import bot
+import db
+
+
+def test_init_db_stamps_schema_version(tmp_path):
+    path = str(tmp_path / 'vibe_tracker.db')
+    db.init_db(path)
+    db.init_db(path)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == db.SCHEMA_VERSION
+    conn.close()
+
+
+def test_startup_bench_measures_first_reply(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db.init_db()
+    request = bot.BenchRequest()
+    application = bot.build_application('0:startup-bench', request)
+
+    asyncio.run(bot.run_startup_bench(application, request))
+
+    assert request.replied_at is not None
+    assert 0 <= bot.startup_timings['reply'] <= bot.startup_timings['first_reply']
+
+
+def test_ready_only_after_application_started(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(bot.startup_state, 'ready', False)
+    db.init_db()
+    application = bot.build_application('0:startup-bench', bot.BenchRequest())
+
+    async def start():
+        await application.initialize()
+        await bot.on_startup(application)
+        assert not bot.startup_state['ready']
+
+        await application.start()
+        for _ in range(100):
+            if bot.startup_state['ready']:
+                break
+            await asyncio.sleep(0.01)
+        await application.stop()
+        await application.shutdown()
+
+    asyncio.run(start())
+    assert bot.startup_state['ready']
@@ -0,0 +1,138 @@
+import os
+import sys
+import sqlite3
+import subprocess
+from datetime import datetime
+
+import pytest
+
+import db
+import vibe_export
+
+
+def make_db(path, chats):
+    db.init_db(str(path))
+    conn = sqlite3.connect(str(path))
+    now = datetime.now()
+    for chat_id in chats:
+        conn.executemany('INSERT INTO user_vibes (user_id, chat_id, username, vibe_score) VALUES (?, ?, ?, ?)',
+                         [(user_id, chat_id, f'u{user_id}', user_id) for user_id in range(5)])
+        conn.executemany('''
+            INSERT INTO vibe_history (user_id, chat_id, change_amount, note, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(i % 5, chat_id, 1, None if i % 2 else 'заметка, "с кавычками"', now) for i in range(250)])
+    conn.commit()
+    conn.close()
+
+
+def count_history(path, chat_id):
+    conn = sqlite3.connect(str(path))
+    result = conn.execute('SELECT COUNT(*), SUM(note IS NULL) FROM vibe_history WHERE chat_id = ?',
+                          (chat_id,)).fetchone()
+    conn.close()
+    return result
+
+
+@pytest.mark.parametrize('fmt', vibe_export.FORMATS)
+def test_round_trip(tmp_path, fmt):
+    make_db(tmp_path / 'src.db', [1, 2])
+    db.init_db(str(tmp_path / 'dst.db'))
+
+    counts = vibe_export.export_data(str(tmp_path / 'dump'), 1, fmt, str(tmp_path / 'src.db'))
+    assert counts['vibe_history'] == 250
+    imported = vibe_export.import_data(str(tmp_path / 'dump'), str(tmp_path / 'dst.db'), batch_size=30)
+
+    assert imported['user_vibes'] == 5
+    assert imported['vibe_history'] == 250
+    assert count_history(tmp_path / 'dst.db', 1) == count_history(tmp_path / 'src.db', 1)
+    assert count_history(tmp_path / 'dst.db', 2)[0] == 0
+
+
+def test_new_export_into_same_directory_is_imported(tmp_path):
+    make_db(tmp_path / 'src.db', [1, 2])
+    db.init_db(str(tmp_path / 'dst.db'))
+    dump = str(tmp_path / 'dump')
+
+    vibe_export.export_data(dump, 1, 'jsonl', str(tmp_path / 'src.db'))
+    vibe_export.import_data(dump, str(tmp_path / 'dst.db'))
+    vibe_export.export_data(dump, 2, 'jsonl', str(tmp_path / 'src.db'))
+    imported = vibe_export.import_data(dump, str(tmp_path / 'dst.db'))
+
+    assert imported['vibe_history'] == 250
+    assert count_history(tmp_path / 'dst.db', 2)[0] == 250
+
+
+def test_interrupted_import_resumes(tmp_path, monkeypatch):
+    make_db(tmp_path / 'src.db', [1])
+    db.init_db(str(tmp_path / 'dst.db'))
+    dump = str(tmp_path / 'dump')
+    vibe_export.export_data(dump, 1, 'csv', str(tmp_path / 'src.db'))
+
+    read_rows = vibe_export.read_rows
+
+    def failing_read_rows(path, fmt, columns):
+        for i, row in enumerate(read_rows(path, fmt, columns)):
+            if 'vibe_history' in path and i == 125:
+                raise OSError('disk went away')
+            yield row
+
+    monkeypatch.setattr(vibe_export, 'read_rows', failing_read_rows)
+    with pytest.raises(OSError):
+        vibe_export.import_data(dump, str(tmp_path / 'dst.db'), batch_size=50)
+    assert count_history(tmp_path / 'dst.db', 1)[0] == 100
+
+    monkeypatch.setattr(vibe_export, 'read_rows', read_rows)
+    imported = vibe_export.import_data(dump, str(tmp_path / 'dst.db'), batch_size=50)
+
+    assert imported['vibe_history'] == 150
+    assert count_history(tmp_path / 'dst.db', 1) == count_history(tmp_path / 'src.db', 1)
+
+
+def test_completed_import_is_not_repeated(tmp_path):
+    make_db(tmp_path / 'src.db', [1])
+    db.init_db(str(tmp_path / 'dst.db'))
+    dump = str(tmp_path / 'dump')
+    vibe_export.export_data(dump, 1, 'jsonl', str(tmp_path / 'src.db'))
+
+    vibe_export.import_data(dump, str(tmp_path / 'dst.db'))
+    imported = vibe_export.import_data(dump, str(tmp_path / 'dst.db'))
+
+    assert imported['vibe_history'] == 0
+    assert count_history(tmp_path / 'dst.db', 1) == count_history(tmp_path / 'src.db', 1)
+    conn = sqlite3.connect(str(tmp_path / 'dst.db'))
+    assert conn.execute('SELECT SUM(changes) FROM vibe_history_daily').fetchone()[0] == 250
+    conn.close()
+
+
+def test_directory_with_both_formats_is_rejected(tmp_path):
+    make_db(tmp_path / 'src.db', [1])
+    db.init_db(str(tmp_path / 'dst.db'))
+    dump = str(tmp_path / 'dump')
+    vibe_export.export_data(dump, 1, 'jsonl', str(tmp_path / 'src.db'))
+    vibe_export.export_data(dump, 1, 'csv', str(tmp_path / 'src.db'))
+
+    with pytest.raises(ValueError):
+        vibe_export.import_data(dump, str(tmp_path / 'dst.db'))
+    assert count_history(tmp_path / 'dst.db', 1)[0] == 0
+
+
+def test_open_export_does_not_block_writes(tmp_path):
+    make_db(tmp_path / 'src.db', [1])
+    reader = sqlite3.connect(str(tmp_path / 'src.db'))
+    rows = vibe_export.iter_rows(reader, 'vibe_history', 1, batch_size=10)
+    next(rows)
+
+    writer = sqlite3.connect(str(tmp_path / 'src.db'), timeout=0.1)
+    writer.execute('UPDATE user_vibes SET vibe_score = vibe_score + 1 WHERE chat_id = 1')
+    writer.commit()
+    writer.close()
+
+    assert sum(1 for _ in rows) == 249
+    reader.close()
+
+
+def test_cli_does_not_load_bot():
+    code = "import sys, vibe_export; print('bot' in sys.modules or 'telegram' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.strip() == 'False'
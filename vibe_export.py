@@ -0,0 +1,253 @@
+import os
+import csv
+import gzip
+import json
+import logging
+import hashlib
+import argparse
+import sqlite3
+from itertools import islice
+
+import db
+
+DB_PATH = db.DB_PATH
+BATCH_SIZE = 1000
+
+# Таблицы в порядке экспорта/импорта: сначала user_vibes, на которые ссылаются остальные.
+# Для каждой таблицы: колонки и способ вставки при импорте.
+TABLES = {
+    'user_vibes': {
+        'columns': ['user_id', 'chat_id', 'username', 'vibe_score', 'last_update',
+                    'last_daily_bonus', 'daily_streak'],
+        'insert': 'INSERT OR REPLACE INTO',
+    },
+    'vibe_history': {
+        # id не переносим: в другой базе он может быть занят
+        'columns': ['user_id', 'chat_id', 'change_amount', 'note', 'timestamp'],
+        'insert': 'INSERT INTO',
+    },
+    'vibe_transfers': {
+        'columns': ['from_user_id', 'to_user_id', 'chat_id', 'amount', 'timestamp'],
+        'insert': 'INSERT INTO',
+    },
+    'achievements': {
+        'columns': ['user_id', 'chat_id', 'achievement_id', 'achieved_at'],
+        'insert': 'INSERT OR REPLACE INTO',
+    },
+}
+
+FORMATS = ('jsonl', 'csv')
+
+
+def table_filename(table, fmt):
+    return f"{table}.{fmt}.gz"
+
+
+# Построчное чтение таблицы без fetchall(): в памяти не больше одной пачки строк
+def iter_rows(conn, table, chat_id=None, batch_size=BATCH_SIZE):
+    columns = TABLES[table]['columns']
+    query = f"SELECT {', '.join(columns)} FROM {table}"
+    params = ()
+    if chat_id is not None:
+        query += " WHERE chat_id = ?"
+        params = (chat_id,)
+
+    c = conn.cursor()
+    c.execute(query, params)
+    while True:
+        rows = c.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            yield row
+
+
+def write_rows(path, fmt, columns, rows):
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str))
+                f.write('\n')
+                count += 1
+    return count
+
+
+def read_rows(path, fmt, columns):
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            index = [header.index(column) for column in columns]
+            for record in reader:
+                # В CSV нет NULL: пустая строка считается отсутствующим значением
+                yield tuple(record[i] if record[i] != '' else None for i in index)
+        else:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                yield tuple(record.get(column) for column in columns)
+
+
+def export_data(out_dir, chat_id=None, fmt='jsonl', db_path=DB_PATH):
+    """Выгружает таблицы в out_dir, по одному сжатому файлу на таблицу.
+
+    Возвращает словарь {таблица: количество строк}.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    counts = {}
+    try:
+        for table, spec in TABLES.items():
+            path = os.path.join(out_dir, table_filename(table, fmt))
+            counts[table] = write_rows(path, fmt, spec['columns'], iter_rows(conn, table, chat_id))
+            logging.info(f"Exported {counts[table]} rows from {table} to {path}")
+    finally:
+        conn.close()
+    return counts
+
+
+def file_digest(path):
+    # Прогресс импорта привязан к содержимому файла, а не к его пути:
+    # новая выгрузка в тот же каталог — это уже другой файл
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _init_progress(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_progress
+        (source TEXT PRIMARY KEY,
+         rows_done INTEGER DEFAULT 0,
+         completed INTEGER DEFAULT 0)
+    ''')
+    conn.commit()
+
+
+def import_file(conn, path, table, fmt, batch_size=BATCH_SIZE):
+    """Загружает один файл пачками через executemany.
+
+    Прогресс хранится в таблице import_progress по хэшу содержимого файла и
+    фиксируется в той же транзакции, что и пачка строк, поэтому прерванный
+    импорт можно просто запустить снова: уже загруженные строки будут
+    пропущены. Полностью загруженный файл отмечается как завершенный и при
+    повторном запуске не загружается второй раз — иначе история удвоится.
+    """
+    spec = TABLES[table]
+    columns = spec['columns']
+    source = file_digest(path)
+    query = (f"{spec['insert']} {table} ({', '.join(columns)}) "
+             f"VALUES ({', '.join('?' for _ in columns)})")
+
+    c = conn.cursor()
+    c.execute('SELECT rows_done, completed FROM import_progress WHERE source = ?', (source,))
+    result = c.fetchone()
+    if result and result[1]:
+        logging.info(f"Skipping {path}: already imported")
+        return 0
+    done = result[0] if result else 0
+
+    rows = islice(read_rows(path, fmt, columns), done, None)
+    imported = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        try:
+            c.executemany(query, batch)
+            done += len(batch)
+            c.execute('''
+                INSERT INTO import_progress (source, rows_done) VALUES (?, ?)
+                ON CONFLICT(source) DO UPDATE SET rows_done = ?
+            ''', (source, done, done))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        imported += len(batch)
+
+    c.execute('''
+        INSERT INTO import_progress (source, rows_done, completed) VALUES (?, ?, 1)
+        ON CONFLICT(source) DO UPDATE SET completed = 1
+    ''', (source, done))
+    conn.commit()
+    return imported
+
+
+def import_data(in_dir, db_path=DB_PATH, batch_size=BATCH_SIZE):
+    """Загружает выгрузку export_data из in_dir в базу db_path.
+
+    Каталог должен содержать выгрузку ровно в одном формате: одни и те же
+    строки в jsonl и csv загрузились бы дважды.
+    Возвращает словарь {таблица: количество загруженных строк}.
+    """
+    formats = [fmt for fmt in FORMATS
+               if any(os.path.exists(os.path.join(in_dir, table_filename(table, fmt))) for table in TABLES)]
+    if not formats:
+        raise ValueError(f"В каталоге {in_dir} нет файлов выгрузки")
+    if len(formats) > 1:
+        raise ValueError(f"В каталоге {in_dir} есть выгрузки в нескольких форматах: {', '.join(formats)}")
+    fmt = formats[0]
+
+    conn = sqlite3.connect(db_path)
+    counts = {}
+    try:
+        _init_progress(conn)
+        for table in TABLES:
+            path = os.path.join(in_dir, table_filename(table, fmt))
+            if os.path.exists(path):
+                counts[table] = import_file(conn, path, table, fmt, batch_size)
+                logging.info(f"Imported {counts[table]} rows into {table} from {path}")
+    finally:
+        conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт и импорт данных дневника вайба")
+    parser.add_argument('--db', default=DB_PATH, help="путь к базе данных")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="выгрузить данные в каталог")
+    export_parser.add_argument('out_dir')
+    export_parser.add_argument('--chat-id', type=int, help="выгрузить только один чат")
+    export_parser.add_argument('--format', choices=FORMATS, default='jsonl')
+
+    import_parser = subparsers.add_parser('import', help="загрузить данные из каталога")
+    import_parser.add_argument('in_dir')
+    import_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    args = parser.parse_args()
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    if args.command == 'export':
+        export_data(args.out_dir, args.chat_id, args.format, args.db)
+    else:
+        # Новая база должна иметь ту же схему, что и у бота
+        db.init_db(args.db)
+        try:
+            import_data(args.in_dir, args.db, args.batch_size)
+        except ValueError as e:
+            parser.error(str(e))
+
+
+if __name__ == '__main__':
+    main()